@@ -3,24 +3,180 @@ AWS Configuration Management
 Auto-detects account settings and manages deployment configuration
 """
 
-import boto3
+import copy
 import json
 import os
+import threading
+import time
+from functools import cache, cached_property, lru_cache
 from pathlib import Path
+from string import Template
+from urllib.parse import urlparse
+
+# boto3/botocore are imported on first use so commands that never reach AWS
+# (--help, argument errors) don't pay for loading them
+
+@cache
+def get_boto_config():
+    """Shared botocore client config"""
+    from botocore.config import Config
+    
+    # Adaptive retries absorb throttling instead of failing outright; keep-alive and a
+    # larger pool let repeated calls (and parallel lookups) reuse TLS connections
+    return Config(
+        retries={'max_attempts': 10, 'mode': 'adaptive'},
+        tcp_keepalive=True,
+        max_pool_connections=25
+    )
+
+@cache
+def get_session():
+    """Shared session so clients reuse one credential chain and endpoint resolver"""
+    import boto3
+    return boto3.session.Session()
+
+# Creating clients from one boto3 Session is not thread-safe, and scripts reach get_client
+# from worker threads (e.g. S3 staging during parallel deploys)
+_CLIENT_LOCK = threading.Lock()
+
+@cache
+def _create_client(service_name):
+    return get_session().client(service_name, config=get_boto_config())
+
+def get_client(service_name):
+    """Get a boto3 client for the service, created once per process"""
+    with _CLIENT_LOCK:
+        return _create_client(service_name)
+
+# S3 actions granted for each service access level
+S3_ACTIONS = {
+    'read-only': ('s3:GetObject', 's3:ListBucket'),
+    'read-write': ('s3:GetObject', 's3:PutObject', 's3:DeleteObject', 's3:ListBucket'),
+    'admin': ('s3:*',)
+}
+
+# Service role trust policy; only the principal ARN varies
+_TRUST_POLICY_TEMPLATE = Template(json.dumps({
+    "Version": "2012-10-17",
+    "Statement": [{
+        "Effect": "Allow",
+        "Principal": {"AWS": "$principal_arn"},
+        "Action": "sts:AssumeRole"
+    }]
+}))
+
+def trust_policy_document(principal_arn):
+    """Trust policy (JSON) allowing the principal to assume a service role"""
+    return _TRUST_POLICY_TEMPLATE.substitute(principal_arn=principal_arn)
+
+def s3_policy_document(permissions, bucket_patterns):
+    """IAM policy (JSON) granting an access level on the bucket patterns"""
+    # Create S3 resources from bucket patterns
+    s3_resources = []
+    for pattern in bucket_patterns:
+        s3_resources.extend([
+            f"arn:aws:s3:::{pattern}",
+            f"arn:aws:s3:::{pattern}/*"
+        ])
+    
+    return json.dumps({
+        "Version": "2012-10-17",
+        "Statement": [{
+            "Effect": "Allow",
+            "Action": S3_ACTIONS[permissions],
+            "Resource": s3_resources
+        }]
+    })
+
+# Lambda function configurations keyed by name: (fetched_at, response)
+FUNCTION_CONFIG_TTL = 30
+_function_configs = {}
+
+def get_function_configuration(function_name):
+    """Get Lambda function configuration, reusing results fetched in the last FUNCTION_CONFIG_TTL seconds"""
+    cached = _function_configs.get(function_name)
+    if cached and time.monotonic() - cached[0] < FUNCTION_CONFIG_TTL:
+        # Callers modify the environment in place, so hand out a copy
+        return copy.deepcopy(cached[1])
+    
+    response = get_client('lambda').get_function_configuration(FunctionName=function_name)
+    _function_configs[function_name] = (time.monotonic(), response)
+    return copy.deepcopy(response)
+
+def invalidate_function_configuration(function_name):
+    """Drop the cached configuration after the function has been updated"""
+    _function_configs.pop(function_name, None)
+
+# Prefix of legacy per-service environment variables (SERVICE_<NAME>)
+SERVICE_ENV_PREFIX = 'SERVICE_'
+
+# Single environment variable holding every service as a {name: config} JSON map
+SERVICE_INDEX_KEY = 'SERVICE_INDEX'
+
+def load_services(env_vars):
+    """Parse registered services from credential service environment variables"""
+    services = {}
+    
+    # Legacy one-variable-per-service entries (SERVICE_<NAME>)
+    for key, value in env_vars.items():
+        if not key.startswith(SERVICE_ENV_PREFIX) or key == SERVICE_INDEX_KEY:
+            continue
+        try:
+            services[key.removeprefix(SERVICE_ENV_PREFIX).lower()] = json.loads(value)
+        except json.JSONDecodeError:
+            continue
+    
+    if SERVICE_INDEX_KEY in env_vars:
+        services.update(json.loads(env_vars[SERVICE_INDEX_KEY]))
+    
+    return services
+
+def store_services(env_vars, services, legacy=False):
+    """Write services into environment variables as SERVICE_INDEX, replacing legacy entries"""
+    for key in [k for k in env_vars if k.startswith(SERVICE_ENV_PREFIX)]:
+        del env_vars[key]
+    # Credential service code predating SERVICE_INDEX only reads SERVICE_<NAME> variables
+    if legacy:
+        for name, config in services.items():
+            env_vars[f"{SERVICE_ENV_PREFIX}{name.upper()}"] = json.dumps(config, separators=(',', ':'), sort_keys=True)
+    # sort_keys keeps the serialized index canonical so unchanged configs compare equal
+    env_vars[SERVICE_INDEX_KEY] = json.dumps(services, separators=(',', ':'), sort_keys=True)
+
+DEPLOYMENT_CONFIG_FILE = Path(__file__).parent / 'deployment.json'
+
+@lru_cache(maxsize=1)
+def _read_deployment_config():
+    """Read deployment.json once per process (cleared by _write_deployment_config)"""
+    if DEPLOYMENT_CONFIG_FILE.exists():
+        with open(DEPLOYMENT_CONFIG_FILE) as f:
+            return json.load(f)
+    return None
+
+def _write_deployment_config(config):
+    """Write deployment.json and drop the cached copy"""
+    with open(DEPLOYMENT_CONFIG_FILE, 'w') as f:
+        json.dump(config, f, indent=2)
+    _read_deployment_config.cache_clear()
 
 class AWSConfig:
     """Dynamic AWS configuration based on current account"""
     
     def __init__(self):
-        self._sts = boto3.client('sts')
-        self._session = boto3.Session()
-        
+        self._sts = get_client('sts')
+        self._session = get_session()
+        self._stack_outputs = None
+    
     @property
+    def cloudformation(self):
+        """CloudFormation client, created on first use"""
+        return get_client('cloudformation')
+        
+    @cached_property
     def account_id(self):
         """Get current AWS account ID"""
         return self._sts.get_caller_identity()['Account']
     
-    @property
+    @cached_property
     def region(self):
         """Get current AWS region"""
         return self._session.region_name or 'us-east-1'
@@ -39,18 +195,26 @@ class AWSConfig:
         """CloudFormation stack name"""
         return "s3bridge-mw"
     
-    def get_api_gateway_url(self):
-        """Get deployed API Gateway URL from CloudFormation"""
+    def fetch_outputs(self):
+        """Get the stack's outputs as a dict, or None if the stack does not exist"""
+        # Only a stack with outputs is remembered; setup may create (or finish) it later in the same run
+        if self._stack_outputs:
+            return self._stack_outputs
         try:
-            cf = boto3.client('cloudformation')
-            outputs = cf.describe_stacks(StackName=self.stack_name)['Stacks'][0]['Outputs']
-            return next(o['OutputValue'] for o in outputs if o['OutputKey'] == 'ApiGatewayUrl')
+            stack = self.cloudformation.describe_stacks(StackName=self.stack_name)['Stacks'][0]
         except Exception:
             return None
+        outputs = {o['OutputKey']: o['OutputValue'] for o in stack.get('Outputs', [])}
+        if outputs:
+            self._stack_outputs = outputs
+        return outputs
+    
+    def get_api_gateway_url(self):
+        """Get deployed API Gateway URL from CloudFormation"""
+        return (self.fetch_outputs() or {}).get('ApiGatewayUrl')
     
     def save_deployment_config(self, api_url, admin_username):
         """Save deployment configuration"""
-        config_file = Path(__file__).parent / 'deployment.json'
         config = {
             'account_id': self.account_id,
             'region': self.region,
@@ -59,22 +223,43 @@ class AWSConfig:
             'stack_name': self.stack_name
         }
         
-        with open(config_file, 'w') as f:
-            json.dump(config, f, indent=2)
+        _write_deployment_config(config)
     
     def load_deployment_config(self):
         """Load saved deployment configuration"""
-        config_file = Path(__file__).parent / 'deployment.json'
-        if config_file.exists():
-            with open(config_file) as f:
-                return json.load(f)
-        return None
+        # Copy so callers can't modify the cached config
+        return copy.deepcopy(_read_deployment_config())
     
-    def is_deployed(self):
-        """Check if infrastructure is deployed"""
+    def cached_api_gateway_id(self, discover):
+        """Get API Gateway ID from deployment config, calling discover() on a miss or if the saved API is gone"""
+        deployment = self.load_deployment_config()
+        # Only trust saved IDs that belong to the current account and region
+        if deployment and (deployment.get('account_id'), deployment.get('region')) == (self.account_id, self.region):
+            api_id = deployment.get('api_gateway_id')
+            if not api_id and deployment.get('api_gateway_url'):
+                # https://<api_id>.execute-api.<region>.amazonaws.com/<stage>
+                api_id = urlparse(deployment['api_gateway_url']).hostname.split('.')[0]
+            if api_id and self._api_gateway_exists(api_id):
+                return api_id
+        
+        api_id = discover()
+        if api_id and deployment:
+            # Remember the discovered ID for later runs
+            deployment['api_gateway_id'] = api_id
+            _write_deployment_config(deployment)
+        return api_id
+    
+    def _api_gateway_exists(self, api_id):
+        """Confirm a saved API Gateway ID still exists (unverifiable IDs are trusted)"""
+        api_client = get_client('apigateway')
         try:
-            cf = boto3.client('cloudformation')
-            cf.describe_stacks(StackName=self.stack_name)
-            return True
+            api_client.get_rest_api(restApiId=api_id)
+        except api_client.exceptions.NotFoundException:
+            return False
         except Exception:
-            return False
\ No newline at end of file
+            pass
+        return True
+    
+    def is_deployed(self):
+        """Check if infrastructure is deployed"""
+        return self.fetch_outputs() is not None
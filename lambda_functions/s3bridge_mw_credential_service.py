@@ -1,7 +1,34 @@
 import json
 import boto3
 import os
-from datetime import datetime
+from botocore.config import Config
+from datetime import datetime, timedelta, timezone
+
+# Older runtime boto3 releases default to the global STS endpoint in us-east-1
+os.environ.setdefault('AWS_STS_REGIONAL_ENDPOINTS', 'regional')
+
+# Reused across invocations while the Lambda container stays warm
+_STS_CLIENT = boto3.client(
+    'sts',
+    config=Config(retries={'max_attempts': 10, 'mode': 'adaptive'}, tcp_keepalive=True)
+)
+
+# Assumed-role credentials keyed by (service, user, duration)
+_CREDENTIALS_CACHE = {}
+_CREDENTIALS_CACHE_SIZE = 256
+# Clients treat credentials as expired 10 minutes early and botocore starts refreshing 15 minutes
+# before that, so a reused entry must outlive both or the client's refresh gets the same credentials back
+_CREDENTIALS_MIN_REMAINING = timedelta(minutes=30)
+
+# Static response fragments, built once per container
+_RESPONSE_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+_ERR_NO_SERVICE = {
+    'statusCode': 400,
+    'body': '{"error": "service parameter required"}'
+}
 
 def get_service_config():
     """Load service configuration from environment variables"""
@@ -17,17 +44,60 @@ def get_service_config():
             'restricted_users': [admin_username]
         }
     
-    # Load services from environment variables
-    for key, value in os.environ.items():
-        if key.startswith('SERVICE_'):
-            service_name = key[8:].lower()  # Remove 'SERVICE_' prefix
-            try:
-                services[service_name] = json.loads(value)
-            except json.JSONDecodeError:
-                continue
+    # Load legacy per-service environment variables (strip 'SERVICE_' prefix)
+    service_vars = [
+        (key.removeprefix('SERVICE_').lower(), value) for key, value in os.environ.items()
+        if key.startswith('SERVICE_') and key != 'SERVICE_INDEX'
+    ]
+    for service_name, value in service_vars:
+        try:
+            services[service_name] = json.loads(value)
+        except json.JSONDecodeError:
+            continue
+    
+    # Load the service index (one JSON map of name -> config)
+    try:
+        services.update(json.loads(os.environ.get('SERVICE_INDEX', '{}')))
+    except json.JSONDecodeError:
+        pass
     
     return services
 
+# Environment variables are fixed for the lifetime of the container, so parse them once
+_SERVICES = get_service_config()
+
+def get_role_credentials(service_name, user_id, role_arn, duration):
+    """Assume service role, reusing cached credentials while most of their lifetime remains"""
+    cache_key = (service_name, user_id, duration)
+    credentials = _CREDENTIALS_CACHE.get(cache_key)
+    # Re-assume once less than half the duration (or the client refresh window) is left
+    min_remaining = max(_CREDENTIALS_MIN_REMAINING, timedelta(seconds=duration) / 2)
+    if credentials and credentials['Expiration'] - datetime.now(timezone.utc) > min_remaining:
+        # Move to the end so the least recently used entry is evicted first
+        _CREDENTIALS_CACHE[cache_key] = _CREDENTIALS_CACHE.pop(cache_key)
+        return credentials
+    
+    response = _STS_CLIENT.assume_role(
+        RoleArn=role_arn,
+        RoleSessionName=f"{service_name}-session-{int(datetime.now().timestamp())}",
+        DurationSeconds=duration
+    )
+    credentials = response['Credentials']
+    
+    _CREDENTIALS_CACHE.pop(cache_key, None)
+    if len(_CREDENTIALS_CACHE) >= _CREDENTIALS_CACHE_SIZE:
+        del _CREDENTIALS_CACHE[next(iter(_CREDENTIALS_CACHE))]
+    _CREDENTIALS_CACHE[cache_key] = credentials
+    
+    return credentials
+
+def error_response(status_code, message):
+    """Build an error response for a dynamic message"""
+    return {
+        'statusCode': status_code,
+        'body': json.dumps({'error': message})
+    }
+
 def lambda_handler(event, context):
     """
     S3Bridge Midway credential service - returns temporary AWS credentials for registered services
@@ -40,20 +110,14 @@ def lambda_handler(event, context):
         duration = int(params.get('duration', '3600'))
         
         if not service_name:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'service parameter required'})
-            }
+            return _ERR_NO_SERVICE
         
         # Load service configuration
-        service_roles = get_service_config()
+        service_roles = _SERVICES
         service_config = service_roles.get(service_name)
         
         if not service_config:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': f'Unknown service: {service_name}'})
-            }
+            return error_response(400, f'Unknown service: {service_name}')
         
         # Extract user ID from request context (set by midway authorizer)
         authorizer_context = event.get('requestContext', {}).get('authorizer', {})
@@ -62,29 +126,16 @@ def lambda_handler(event, context):
         # Check user restrictions for service
         if 'restricted_users' in service_config:
             if user_id not in service_config['restricted_users']:
-                return {
-                    'statusCode': 403,
-                    'body': json.dumps({'error': f'User {user_id} not authorized for service {service_name}'})
-                }
+                return error_response(403, f'User {user_id} not authorized for service {service_name}')
         
         role_arn = service_config['role']
         
-        # Assume role
-        sts_client = boto3.client('sts')
-        response = sts_client.assume_role(
-            RoleArn=role_arn,
-            RoleSessionName=f"{service_name}-session-{int(datetime.now().timestamp())}",
-            DurationSeconds=min(duration, 3600)
-        )
-        
-        credentials = response['Credentials']
+        # Assume role (cached per service and user)
+        credentials = get_role_credentials(service_name, user_id, role_arn, min(duration, 3600))
         
         return {
             'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': _RESPONSE_HEADERS,
             'body': json.dumps({
                 'AccessKeyId': credentials['AccessKeyId'],
                 'SecretAccessKey': credentials['SecretAccessKey'],
@@ -94,7 +145,4 @@ def lambda_handler(event, context):
         }
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        return error_response(500, str(e))
\ No newline at end of file
@@ -1,4 +1,72 @@
 import json
+import os
+import re
+import base64
+import logging
+import urllib.parse
+
+logger = logging.getLogger()
+# Level names are case-insensitive here; an unknown name falls back to WARNING rather than failing init
+_log_level = logging.getLevelName(os.environ.get('LOG_LEVEL', 'WARNING').strip().upper())
+logger.setLevel(_log_level if isinstance(_log_level, int) else logging.WARNING)
+
+# Required Midway cookies for authentication
+REQUIRED_COOKIES = ('amazon_enterprise_access', 'session')
+
+# Username claim key searched for in the raw (bytes) JWT payload
+_USERNAME_CLAIM = b'"logged_in_username"'
+
+# Case-insensitive fallback match, avoids lowercasing the whole cookie
+_FALLBACK_USER_RE = re.compile('zavaugha', re.IGNORECASE)
+
+def extract_midway_user(cookies):
+    """Extract the Midway username from the amazon_enterprise_access cookie"""
+    user_id = 'unknown'
+    try:
+        # Locate the cookie value directly instead of splitting every cookie pair
+        start = cookies.find('amazon_enterprise_access=')
+        if start != -1:
+            end = cookies.find(';', start)
+            part = cookies[start:end if end != -1 else None]
+            cookie_value = part.split('=', 1)[1].strip()
+            # Decode URL-encoded cookie
+            decoded = urllib.parse.unquote(cookie_value)
+            
+            # JWT token - decode the payload (middle part)
+            try:
+                # Locate segment boundaries rather than splitting on every dot
+                first_dot = decoded.find('.')
+                if first_dot != -1:
+                    second_dot = decoded.find('.', first_dot + 1)
+                    # Decode JWT payload (base64url, padding stripped)
+                    payload = decoded[first_dot + 1:second_dot if second_dot != -1 else None].encode()
+                    payload_bytes = base64.urlsafe_b64decode(payload + b'=' * (-len(payload) % 4))
+                    
+                    # Look for logged_in_username in JWT payload
+                    logger.debug("JWT payload: %s...", payload_bytes[:200])
+                    claim_start = payload_bytes.find(_USERNAME_CLAIM)
+                    if claim_start != -1:
+                        # Only a string value counts: whitespace, one ':', whitespace, then '"'
+                        rest = payload_bytes[claim_start + len(_USERNAME_CLAIM):].lstrip()
+                        value = rest[1:].lstrip() if rest[:1] == b':' else b''
+                        value_end = value.find(b'"', 1) if value[:1] == b'"' else -1
+                        if value_end > 1:
+                            user_id = value[1:value_end].decode('utf-8')
+                            logger.debug("Extracted user ID: %s", user_id)
+            except Exception:
+                pass
+            
+            # Fallback: if we find 'zavaugha' anywhere, use it
+            if user_id == 'unknown' and _FALLBACK_USER_RE.search(decoded):
+                user_id = 'zavaugha'
+    except Exception:
+        pass
+    
+    # Final fallback: authenticated but unknown user
+    if user_id == 'unknown':
+        user_id = 'authenticated_user'
+    
+    return user_id
 
 def lambda_handler(event, context):
     """
@@ -6,75 +74,27 @@ def lambda_handler(event, context):
     """
     
     try:
-        print(f"Authorizer event: {json.dumps(event)}")
         # Extract cookies from headers or authorizationToken
-        headers = event.get('headers', {})
+        headers = event.get('headers') or {}
         cookies = headers.get('Cookie', '') or headers.get('cookie', '') or event.get('authorizationToken', '')
-        print(f"Cookies: {cookies[:100]}...")
-        
-        # Required Midway cookies for authentication
-        required_cookies = ['amazon_enterprise_access', 'session']
-        
-        # Check if all required cookies are present
-        has_auth = all(cookie_name in cookies for cookie_name in required_cookies)
         
-        if not has_auth:
+        # Reject requests without the required cookies before doing any other work
+        if not all(cookie_name in cookies for cookie_name in REQUIRED_COOKIES):
             raise Exception('Unauthorized - Missing required Midway cookies')
         
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Authorizer event: %s", json.dumps(event))
+            logger.debug("Cookies: %s...", cookies[:100])
+        
         # Extract user identity from cookies
-        user_id = 'unknown'
-        if 'amazon_enterprise_access' in cookies:
-            try:
-                import urllib.parse
-                import base64
-                import re
-                
-                # Parse cookie value to extract user ID
-                cookie_parts = cookies.split(';')
-                for part in cookie_parts:
-                    if 'amazon_enterprise_access' in part:
-                        cookie_value = part.split('=', 1)[1].strip()
-                        # Decode URL-encoded cookie
-                        decoded = urllib.parse.unquote(cookie_value)
-                        
-                        # JWT token - decode the payload (middle part)
-                        try:
-                            jwt_parts = decoded.split('.')
-                            if len(jwt_parts) >= 2:
-                                # Decode JWT payload (base64)
-                                payload = jwt_parts[1]
-                                # Add padding if needed
-                                payload += '=' * (4 - len(payload) % 4)
-                                payload_decoded = base64.b64decode(payload).decode('utf-8')
-                                
-                                # Look for logged_in_username in JWT payload
-                                print(f"JWT payload: {payload_decoded[:200]}...")
-                                username_match = re.search(r'"logged_in_username"\s*:\s*"([^"]+)"', payload_decoded)
-                                if username_match:
-                                    user_id = username_match.group(1)
-                                    print(f"Extracted user ID: {user_id}")
-                                    break
-                        except Exception:
-                            pass
-                        
-                        # Fallback: if we find 'zavaugha' anywhere, use it
-                        if user_id == 'unknown' and 'zavaugha' in decoded.lower():
-                            user_id = 'zavaugha'
-                        
-                        # Final fallback: authenticated but unknown user
-                        if user_id == 'unknown':
-                            user_id = 'authenticated_user'
-                        
-                        break
-            except Exception:
-                user_id = 'authenticated_user'
+        user_id = extract_midway_user(cookies)
         
-        print(f"Final user ID: {user_id}")
+        logger.debug("Final user ID: %s", user_id)
         
         # User access control (example restrictions)
         restricted_users = ['test_user', 'demo_user']
         if user_id in restricted_users:
-            print(f"User {user_id} is restricted")
+            logger.warning("User %s is restricted", user_id)
             raise Exception('Unauthorized - User access restricted')
         
         # Generate allow policy with user context
@@ -99,6 +119,6 @@ def lambda_handler(event, context):
         return policy
         
     except Exception as e:
-        print(f"Authorizer error: {str(e)}")
+        logger.warning("Authorizer error: %s", e)
         # Return deny policy for any error
         raise Exception('Unauthorized')
\ No newline at end of file
@@ -3,8 +3,23 @@ S3Bridge Midway
 Account-agnostic credential service for secure S3 access with Midway authentication
 """
 
-from .s3bridge_client import S3BridgeClient
-from .s3bridge_auth import S3BridgeAuthProvider
+import importlib
 
 __version__ = "1.0.0"
-__all__ = ["S3BridgeClient", "S3BridgeAuthProvider"]
\ No newline at end of file
+__all__ = ["S3BridgeClient", "S3BridgeAuthProvider"]
+
+# Public name -> submodule; loaded on first access so `import s3bridge_mw` (and the CLI) skip boto3
+_LAZY_IMPORTS = {
+    "S3BridgeClient": ".s3bridge_client",
+    "S3BridgeAuthProvider": ".s3bridge_auth",
+}
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        value = getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
\ No newline at end of file
@@ -45,6 +45,7 @@ Examples:
                            default='read-write', help='Permissions')
     add_parser.add_argument('--restricted-users', help='Comma-separated list of allowed users')
     add_parser.add_argument('--force', action='store_true', help='Overwrite existing service')
+    add_parser.add_argument('--yes', action='store_true', help='Answer yes to all prompts')
     
     # List services
     subparsers.add_parser('list', help='List services')
@@ -88,6 +89,8 @@ Examples:
             sys.argv.extend(['--restricted-users', args.restricted_users])
         if args.force:
             sys.argv.append('--force')
+        if args.yes:
+            sys.argv.append('--yes')
         return add_main()
     
     elif args.command == 'list':
@@ -5,14 +5,59 @@ Handles Midway authentication and credential management for any service
 
 import os
 import json
+import functools
+import threading
+import weakref
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from pathlib import Path
 
+# Shared HTTP session so credential refreshes reuse TCP/TLS connections
+_HTTP = requests.Session()
+_HTTP.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+@functools.lru_cache(maxsize=1)
+def _load_api_endpoint() -> str:
+    """Read the credential endpoint from deployment config (cached per process)"""
+    # Try to load from deployment config
+    config_file = Path(__file__).parent.parent / "config" / "deployment.json"
+    if config_file.exists():
+        try:
+            with open(config_file) as f:
+                config = json.load(f)
+                api_url = config.get('api_gateway_url')
+                if api_url:
+                    return f"{api_url}/credentials"
+        except Exception:
+            pass
+    
+    # Fallback - this should be set during deployment
+    raise Exception("S3Bridge Midway not deployed. Run: s3bridge-mw setup")
+
+@functools.lru_cache(maxsize=4)
+def _read_cookie_file(cookie_file: str, mtime_ns: int) -> str:
+    """Read a Midway cookie file; cached per path and modification time"""
+    with open(cookie_file) as f:
+        return f.read().strip()
+
+def _background_refresh(provider_ref):
+    """Timer callback; a failure leaves the next get_credentials() to refresh synchronously"""
+    provider = provider_ref()
+    if provider is None:
+        return
+    try:
+        provider._fetch_fresh_credentials()
+    except Exception:
+        pass
+
 class S3BridgeAuthProvider:
     """S3Bridge authentication provider for AWS credentials via Midway"""
     
+    # Refresh in the background this long before expiry, ahead of botocore's 15 minute advisory window
+    _BACKGROUND_REFRESH_LEAD = timedelta(minutes=20)
+    
     def __init__(self, service_name: str = "default"):
         """
         Initialize auth provider
@@ -23,36 +68,34 @@ class S3BridgeAuthProvider:
         self.service_name = service_name
         self._cached_credentials = None
         self._credentials_expiry = None
+        self._lock = threading.Lock()
+        self._refresh_timer = None
         
     def get_credentials(self) -> Dict[str, Any]:
         """Get AWS credentials via Midway authentication"""
-        if self._cached_credentials and not self.credentials_expired():
-            return self._cached_credentials
+        return self.get_credentials_with_expiry()[0]
+    
+    def get_credentials_with_expiry(self) -> Tuple[Dict[str, Any], datetime]:
+        """Get AWS credentials together with the time they should be treated as expired"""
+        # Read both under the lock so a background refresh can't pair new credentials with an old expiry
+        with self._lock:
+            credentials, expiry = self._cached_credentials, self._credentials_expiry
+        if credentials and datetime.now(expiry.tzinfo) < expiry:
+            return credentials, expiry
             
-        return self._fetch_fresh_credentials()
+        return self._request_credentials()
     
     def credentials_expired(self) -> bool:
         """Check if cached credentials are expired"""
-        if not self._credentials_expiry:
+        with self._lock:
+            expiry = self._credentials_expiry
+        if not expiry:
             return True
-        return datetime.now(self._credentials_expiry.tzinfo) >= self._credentials_expiry
+        return datetime.now(expiry.tzinfo) >= expiry
     
     def _get_api_endpoint(self) -> str:
         """Get S3Bridge Midway API endpoint"""
-        # Try to load from deployment config
-        config_file = Path(__file__).parent.parent / "config" / "deployment.json"
-        if config_file.exists():
-            try:
-                with open(config_file) as f:
-                    config = json.load(f)
-                    api_url = config.get('api_gateway_url')
-                    if api_url:
-                        return f"{api_url}/credentials"
-            except Exception:
-                pass
-        
-        # Fallback - this should be set during deployment
-        raise Exception("S3Bridge Midway not deployed. Run: s3bridge-mw setup")
+        return _load_api_endpoint()
     
     def _get_midway_cookies(self) -> str:
         """Get Midway cookies from browser or environment"""
@@ -69,22 +112,25 @@ class S3BridgeAuthProvider:
         ]
         
         for cookie_file in cookie_sources:
-            if os.path.exists(cookie_file):
-                try:
-                    with open(cookie_file) as f:
-                        return f.read().strip()
-                except Exception:
-                    continue
+            try:
+                # A single stat both checks existence and keys the cache
+                return _read_cookie_file(cookie_file, os.stat(cookie_file).st_mtime_ns)
+            except Exception:
+                continue
         
         raise Exception("Midway authentication required. Please authenticate via Midway.")
     
     def _fetch_fresh_credentials(self) -> Dict[str, Any]:
         """Fetch fresh credentials from API"""
+        return self._request_credentials()[0]
+    
+    def _request_credentials(self) -> Tuple[Dict[str, Any], datetime]:
+        """Fetch fresh credentials from API and cache them with their expiry"""
         endpoint = self._get_api_endpoint()
         cookies = self._get_midway_cookies()
         
         try:
-            response = requests.get(
+            response = _HTTP.get(
                 endpoint,
                 params={'service': self.service_name, 'duration': '3600'},
                 headers={'Cookie': cookies},
@@ -94,8 +140,7 @@ class S3BridgeAuthProvider:
             if response.status_code == 200:
                 creds_data = response.json()
                 
-                # Cache credentials
-                self._cached_credentials = {
+                credentials = {
                     'access_key': creds_data['AccessKeyId'],
                     'secret_key': creds_data['SecretAccessKey'],
                     'session_token': creds_data['SessionToken']
@@ -103,19 +148,49 @@ class S3BridgeAuthProvider:
                 
                 # Set expiry (10 minutes before actual expiry)
                 expiry_time = datetime.fromisoformat(creds_data['Expiration'].replace('Z', '+00:00'))
-                self._credentials_expiry = expiry_time - timedelta(minutes=10)
+                expiry = expiry_time - timedelta(minutes=10)
+                
+                # Cache credentials; swap both fields together so readers never see a mixed pair
+                with self._lock:
+                    self._cached_credentials = credentials
+                    self._credentials_expiry = expiry
+                    self._schedule_refresh()
                 
-                return self._cached_credentials
+                return credentials, expiry
             else:
                 raise Exception(f"Credential service failed with status {response.status_code}: {response.text}")
                 
         except Exception as e:
             raise Exception(f"S3Bridge Midway credential service failed: {str(e)}")
     
+    def _schedule_refresh(self):
+        """Start a background refresh shortly before the cached credentials expire (caller holds the lock)"""
+        self._cancel_refresh()
+        delay = self._credentials_expiry - self._BACKGROUND_REFRESH_LEAD - datetime.now(self._credentials_expiry.tzinfo)
+        if delay.total_seconds() <= 0:
+            # Too short-lived to refresh early; botocore's refresh picks up new credentials once these expire
+            return
+        # Weak reference so the pending timer does not keep an unused provider alive
+        self._refresh_timer = threading.Timer(
+            delay.total_seconds(), _background_refresh, args=(weakref.ref(self),)
+        )
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+    
+    def _cancel_refresh(self):
+        """Cancel any pending background refresh"""
+        if self._refresh_timer:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+    
     def invalidate_credentials(self):
         """Force refresh of cached credentials"""
-        self._cached_credentials = None
-        self._credentials_expiry = None
+        with self._lock:
+            self._cancel_refresh()
+            self._cached_credentials = None
+            self._credentials_expiry = None
+        # Re-read the endpoint too, in case the service was redeployed
+        _load_api_endpoint.cache_clear()
     
     def reset_authentication(self):
         """Reset authentication state"""
@@ -4,45 +4,99 @@ A modular S3 access approach with Midway authentication
 """
 
 import boto3
-import json
+import orjson
 import io
+import os
 import csv
+import shutil
+import uuid
+import atexit
 import threading
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
+from botocore.config import Config
+from botocore.credentials import RefreshableCredentials
 from botocore.exceptions import ClientError
-from typing import List, Optional, Dict, Any, BinaryIO, Union
+from botocore.session import get_session
+from typing import List, Optional, Dict, Any, BinaryIO, Iterator, Union
 from .s3bridge_auth import S3BridgeAuthProvider
 
+# Clients holding buffered CSV rows, flushed at interpreter exit; strong references keep
+# a client (and its rows) alive until its buffer has been written
+_PENDING_CSV_CLIENTS = set()
+
+@atexit.register
+def _flush_pending_csv():
+    for client in list(_PENDING_CSV_CLIENTS):
+        client.flush_csv()
+
 class S3BridgeClient:
     """S3Bridge client with credential management and common operations"""
     
-    def __init__(self, bucket_name: str, service_name: str = "default"):
+    # Shared, bounded worker pool for write_async
+    _EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get('S3BRIDGE_IO_THREADS', '8')))
+    
+    # Objects below this size skip the managed (multipart, threaded) transfer path
+    _SMALL_OBJECT_SIZE = 5 * 1024 * 1024
+    
+    # Larger parts and more threads than boto3's defaults (8MB, 10) for big managed transfers
+    _TRANSFER_CONFIG = TransferConfig(max_concurrency=32, multipart_chunksize=16 * 1024 * 1024)
+    
+    # Adaptive retries ride out throttling; the pool matches the transfer concurrency
+    _S3_CONFIG = Config(
+        retries={'max_attempts': 10, 'mode': 'adaptive'},
+        tcp_keepalive=True,
+        max_pool_connections=32
+    )
+    
+    # Maximum keys S3 accepts in one delete_objects request
+    _DELETE_BATCH_SIZE = 1000
+    
+    def __init__(self, bucket_name: str, service_name: str = "default", csv_buffer_size: int = 1):
         """
         Initialize S3 client with S3Bridge Midway authentication
         
         Args:
             bucket_name: Target S3 bucket name
             service_name: Service identifier for credential API
+            csv_buffer_size: Rows buffered per CSV key before appending to S3 (1 writes each row through)
         """
         self.bucket_name = bucket_name
         self.service_name = service_name
         self._s3_client = None
         self._auth_provider = S3BridgeAuthProvider(service_name)
+        self._csv_buffer: Dict[str, List[List[str]]] = {}
+        self._csv_buffer_size = max(1, csv_buffer_size)
+        self._csv_lock = threading.RLock()
         
         # Validate bucket access for service
         self._validate_bucket_access()
         
     def _get_s3_client(self):
-        """Get authenticated S3 client, refreshing credentials if needed"""
-        if not self._s3_client or self._auth_provider.credentials_expired():
-            credentials = self._auth_provider.get_credentials()
-            session = boto3.Session(
-                aws_access_key_id=credentials['access_key'],
-                aws_secret_access_key=credentials['secret_key'],
-                aws_session_token=credentials.get('session_token')
+        """Get authenticated S3 client; botocore refreshes credentials in place"""
+        if not self._s3_client:
+            credentials = RefreshableCredentials.create_from_metadata(
+                metadata=self._refresh_credential_metadata(),
+                refresh_using=self._refresh_credential_metadata,
+                method='sts-assume-role'
             )
-            self._s3_client = session.client('s3')
+            botocore_session = get_session()
+            botocore_session._credentials = credentials
+            session = boto3.Session(botocore_session=botocore_session)
+            self._s3_client = session.client('s3', config=self._S3_CONFIG)
         return self._s3_client
+    
+    def _refresh_credential_metadata(self) -> Dict[str, str]:
+        """Get the auth provider's current credentials as botocore refresh metadata"""
+        # The provider refreshes ahead of botocore's window in the background, so this is usually a cache hit
+        credentials, expiry = self._auth_provider.get_credentials_with_expiry()
+        return {
+            'access_key': credentials['access_key'],
+            'secret_key': credentials['secret_key'],
+            'token': credentials.get('session_token'),
+            'expiry_time': expiry.isoformat()
+        }
 
     
     def _validate_bucket_access(self):
@@ -52,26 +106,30 @@ class S3BridgeClient:
         pass
     
     def file_exists(self, key: str) -> bool:
-        """Check if file exists in S3"""
+        """Check if file exists in S3 (errors other than a missing key are raised)"""
         try:
             self._get_s3_client().head_object(Bucket=self.bucket_name, Key=key)
             return True
-        except ClientError:
-            return False
+        except ClientError as e:
+            # head_object has no body, so a missing key surfaces as a bare 404
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
     
     def read_json(self, key: str) -> Optional[Dict[str, Any]]:
         """Read JSON file from S3"""
         try:
             response = self._get_s3_client().get_object(Bucket=self.bucket_name, Key=key)
-            content = response['Body'].read().decode('utf-8')
-            return json.loads(content)
-        except (ClientError, json.JSONDecodeError):
+            # orjson parses (and validates UTF-8 in) the raw bytes directly
+            return orjson.loads(response['Body'].read())
+        except (ClientError, orjson.JSONDecodeError):
             return None
     
     def write_json(self, data: Dict[str, Any], key: str) -> bool:
         """Write JSON data to S3"""
         try:
-            json_data = json.dumps(data, indent=4)
+            # Compact output: objects are machine-read, and indentation adds ~30% to the upload
+            json_data = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
             self._get_s3_client().put_object(
                 Body=json_data,
                 Bucket=self.bucket_name,
@@ -84,6 +142,8 @@ class S3BridgeClient:
     
     def read_text(self, key: str) -> Optional[str]:
         """Read text file from S3"""
+        if key in self._csv_buffer:
+            self.flush_csv(key)
         try:
             response = self._get_s3_client().get_object(Bucket=self.bucket_name, Key=key)
             return response['Body'].read().decode('utf-8')
@@ -106,7 +166,11 @@ class S3BridgeClient:
     def upload_file(self, local_path: str, key: str) -> bool:
         """Upload file to S3"""
         try:
-            self._get_s3_client().upload_file(local_path, self.bucket_name, key)
+            if os.path.getsize(local_path) < self._SMALL_OBJECT_SIZE:
+                with open(local_path, 'rb') as f:
+                    self._get_s3_client().put_object(Bucket=self.bucket_name, Key=key, Body=f)
+            else:
+                self._get_s3_client().upload_file(local_path, self.bucket_name, key, Config=self._TRANSFER_CONFIG)
             return True
         except ClientError:
             return False
@@ -114,32 +178,97 @@ class S3BridgeClient:
     def download_file(self, key: str, local_path: str) -> bool:
         """Download file from S3"""
         try:
-            self._get_s3_client().download_file(self.bucket_name, key, local_path)
+            # Size the object first so large ones never open (and abandon) a full GET stream
+            size = self._get_s3_client().head_object(Bucket=self.bucket_name, Key=key)['ContentLength']
+            if size < self._SMALL_OBJECT_SIZE:
+                response = self._get_s3_client().get_object(Bucket=self.bucket_name, Key=key)
+                # Write beside the target and rename, as the managed transfer does (same temp naming),
+                # so a failed read never leaves a truncated file at local_path
+                temp_path = f"{local_path}.{uuid.uuid4().hex[:8]}"
+                temp_file = open(temp_path, 'xb')
+                try:
+                    with temp_file:
+                        shutil.copyfileobj(response['Body'], temp_file)
+                    os.replace(temp_path, local_path)
+                except BaseException:
+                    os.unlink(temp_path)
+                    raise
+            else:
+                self._get_s3_client().download_file(self.bucket_name, key, local_path, Config=self._TRANSFER_CONFIG)
             return True
         except ClientError:
             return False
     
-    def list_objects(self, prefix: str = '') -> List[str]:
-        """List objects in bucket with optional prefix"""
+    def list_objects(self, prefix: str = '') -> Iterator[str]:
+        """Iterate over object keys in bucket with optional prefix, one page at a time"""
+        paginator = self._get_s3_client().get_paginator('list_objects_v2')
+        pages = iter(paginator.paginate(Bucket=self.bucket_name, Prefix=prefix))
+        # A failure on the first page yields nothing, as before; later failures are raised
+        # so a partial listing is never mistaken for a complete one
         try:
-            response = self._get_s3_client().list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix
-            )
-            return [obj['Key'] for obj in response.get('Contents', [])]
+            page = next(pages, {})
         except ClientError:
-            return []
+            return
+        while page:
+            for obj in page.get('Contents', []):
+                yield obj['Key']
+            page = next(pages, None)
+    
+    def list_objects_all(self, prefix: str = '') -> List[str]:
+        """List all object keys in bucket with optional prefix"""
+        return list(self.list_objects(prefix))
     
     def delete_object(self, key: str) -> bool:
         """Delete object from S3"""
+        return self.delete_objects([key]) == 1
+    
+    def delete_objects(self, keys: List[str]) -> int:
+        """Delete objects from S3 in batches, returning the number deleted"""
+        deleted = 0
         try:
-            self._get_s3_client().delete_object(Bucket=self.bucket_name, Key=key)
-            return True
+            for start in range(0, len(keys), self._DELETE_BATCH_SIZE):
+                batch = keys[start:start + self._DELETE_BATCH_SIZE]
+                # Quiet mode only reports failures, keeping the response small
+                response = self._get_s3_client().delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                )
+                deleted += len(batch) - len(response.get('Errors', []))
         except ClientError:
-            return False
+            pass
+        return deleted
     
     def append_csv_row(self, key: str, row_data: List[str]) -> bool:
-        """Append row to CSV file in S3"""
+        """Append row to CSV file in S3 (buffered when csv_buffer_size > 1, see flush_csv)"""
+        if self._csv_buffer_size == 1:
+            return self._append_csv_rows(key, [list(row_data)])
+        with self._csv_lock:
+            rows = self._csv_buffer.setdefault(key, [])
+            rows.append(list(row_data))
+            _PENDING_CSV_CLIENTS.add(self)
+            if len(rows) < self._csv_buffer_size:
+                return True
+            return self.flush_csv(key)
+    
+    def flush_csv(self, key: Optional[str] = None) -> bool:
+        """Append buffered CSV rows to S3 for one key, or all keys if none given"""
+        success = True
+        with self._csv_lock:
+            keys = [key] if key is not None else list(self._csv_buffer)
+            for csv_key in keys:
+                rows = self._csv_buffer.pop(csv_key, None)
+                if not rows:
+                    continue
+                if not self._append_csv_rows(csv_key, rows):
+                    # Keep rows buffered so a later flush can retry
+                    self._csv_buffer[csv_key] = rows
+                    success = False
+            if not self._csv_buffer:
+                _PENDING_CSV_CLIENTS.discard(self)
+        return success
+    
+    def _append_csv_rows(self, key: str, rows: List[List[str]]) -> bool:
+        """Write rows after the existing CSV content in a single upload"""
         try:
             existing_content = self.read_text(key) or ""
             output = io.StringIO()
@@ -150,13 +279,11 @@ class S3BridgeClient:
                 if not existing_content.endswith('\n'):
                     output.write('\n')
             
-            writer.writerow(row_data)
+            writer.writerows(rows)
             return self.write_text(output.getvalue(), key)
         except Exception:
             return False
     
-    def write_async(self, content: str, key: str) -> None:
-        """Write content to S3 asynchronously"""
-        def _write():
-            self.write_text(content, key)
-        threading.Thread(target=_write, daemon=True).start()
\ No newline at end of file
+    def write_async(self, content: str, key: str) -> Future:
+        """Write content to S3 asynchronously; the returned future resolves to write_text's result"""
+        return self._EXECUTOR.submit(self.write_text, content, key)
\ No newline at end of file
@@ -4,22 +4,49 @@ Add Service Script
 Creates IAM role and updates Lambda configuration for new service
 """
 
-import boto3
-import json
 import argparse
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config.aws_config import AWSConfig
+from config.aws_config import (
+    AWSConfig, get_client, get_function_configuration, invalidate_function_configuration,
+    load_services, store_services, s3_policy_document, trust_policy_document
+)
+from scripts.deploy_lambda_only import credential_service_current
+
+def confirm(message, assume_yes=False):
+    """Ask a y/N question; assume_yes answers yes, and without a terminal the default (no) is used"""
+    if assume_yes:
+        return True
+    if not sys.stdin.isatty():
+        print(f"{message} (y/N): n (non-interactive, pass --yes to confirm)")
+        return False
+    return input(f"{message} (y/N): ").lower().strip() == 'y'
+
+def api_uses_credential_service(api_client, api_id):
+    """Check whether any GET method of an API integrates with the credential service"""
+    try:
+        # embed=['methods'] returns each method's integration inline, so no get_integration calls
+        paginator = api_client.get_paginator('get_resources')
+        for page in paginator.paginate(restApiId=api_id, embed=['methods'], PaginationConfig={'PageSize': 500}):
+            for resource in page['items']:
+                get_method = resource.get('resourceMethods', {}).get('GET', {})
+                integration_uri = get_method.get('methodIntegration', {}).get('uri', '')
+                if 's3bridge-mw-credential-service' in integration_uri:
+                    return True
+    except Exception:
+        pass
+    return False
 
 def find_existing_api_gateway():
     """Find existing API Gateway that uses universal-credential-service"""
     try:
-        api_client = boto3.client('apigateway')
-        lambda_client = boto3.client('lambda')
+        api_client = get_client('apigateway')
+        lambda_client = get_client('lambda')
         
         # Get s3bridge-mw-credential-service function ARN
         try:
@@ -28,36 +55,27 @@ def find_existing_api_gateway():
         except lambda_client.exceptions.ResourceNotFoundException:
             return None
         
-        # List all APIs
-        apis = api_client.get_rest_apis()
+        # List all APIs (every page, not just the first 25)
+        paginator = api_client.get_paginator('get_rest_apis')
+        api_ids = [
+            api['id']
+            for page in paginator.paginate(PaginationConfig={'PageSize': 500})
+            for api in page['items']
+        ]
+        if not api_ids:
+            return None
         
-        for api in apis['items']:
-            api_id = api['id']
-            try:
-                # Get resources for this API
-                resources = api_client.get_resources(restApiId=api_id)
-                
-                for resource in resources['items']:
-                    # Check if this resource has GET method
-                    if 'GET' in resource.get('resourceMethods', {}):
-                        try:
-                            # Get integration for GET method
-                            integration = api_client.get_integration(
-                                restApiId=api_id,
-                                resourceId=resource['id'],
-                                httpMethod='GET'
-                            )
-                            
-                            # Check if integration points to our Lambda function
-                            integration_uri = integration.get('uri', '')
-                            if 's3bridge-mw-credential-service' in integration_uri:
-                                return api_id
-                                
-                        except Exception:
-                            continue
-                            
-            except Exception:
-                continue
+        # boto3 clients are thread-safe, so scan the APIs concurrently
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            futures = {
+                executor.submit(api_uses_credential_service, api_client, api_id): api_id
+                for api_id in api_ids
+            }
+            for future in as_completed(futures):
+                if future.result():
+                    for pending in futures:
+                        pending.cancel()
+                    return futures[future]
                 
         return None
         
@@ -68,95 +86,52 @@ def find_existing_api_gateway():
 def create_service_role(service_name, bucket_patterns, permissions, config):
     """Create IAM role for service"""
     
-    iam = boto3.client('iam')
+    iam = get_client('iam')
     role_name = f"{service_name}-s3-access-role"
     
-    # S3 permissions based on access level
-    s3_actions = {
-        'read-only': ['s3:GetObject', 's3:ListBucket'],
-        'read-write': ['s3:GetObject', 's3:PutObject', 's3:DeleteObject', 's3:ListBucket'],
-        'admin': ['s3:*']
-    }
-    
-    # Create S3 resources from bucket patterns
-    s3_resources = []
-    for pattern in bucket_patterns:
-        s3_resources.extend([
-            f"arn:aws:s3:::{pattern}",
-            f"arn:aws:s3:::{pattern}/*"
-        ])
-    
-    # IAM policy document
-    policy_doc = {
-        "Version": "2012-10-17",
-        "Statement": [{
-            "Effect": "Allow",
-            "Action": s3_actions[permissions],
-            "Resource": s3_resources
-        }]
-    }
-    
-    # Trust policy for Lambda role
-    trust_policy = {
-        "Version": "2012-10-17",
-        "Statement": [{
-            "Effect": "Allow",
-            "Principal": {"AWS": config.lambda_role_arn},
-            "Action": "sts:AssumeRole"
-        }]
-    }
-    
+    # A cheap lookup avoids the create_role error path for roles that already exist
     try:
+        iam.get_role(RoleName=role_name)
+        role_exists = True
+    except iam.exceptions.NoSuchEntityException:
+        role_exists = False
+    
+    if role_exists:
+        print(f"Role {role_name} already exists, updating policy...")
+    else:
         # Create role
         iam.create_role(
             RoleName=role_name,
             Path='/service-role/',
-            AssumeRolePolicyDocument=json.dumps(trust_policy),
+            AssumeRolePolicyDocument=trust_policy_document(config.lambda_role_arn),
             Description=f"Universal S3 Library service role for {service_name}"
         )
-        
-        # Attach policy
-        iam.put_role_policy(
-            RoleName=role_name,
-            PolicyName=f"{service_name}S3AccessPolicy",
-            PolicyDocument=json.dumps(policy_doc)
-        )
-        
+    
+    # Attach (or update) policy
+    iam.put_role_policy(
+        RoleName=role_name,
+        PolicyName=f"{service_name}S3AccessPolicy",
+        PolicyDocument=s3_policy_document(permissions, bucket_patterns)
+    )
+    
+    if not role_exists:
         print(f"Created IAM role: {role_name}")
-        return config.service_role_arn(service_name)
-        
-    except iam.exceptions.EntityAlreadyExistsException:
-        print(f"Role {role_name} already exists, updating policy...")
-        
-        # Update existing policy
-        iam.put_role_policy(
-            RoleName=role_name,
-            PolicyName=f"{service_name}S3AccessPolicy",
-            PolicyDocument=json.dumps(policy_doc)
-        )
-        
-        return config.service_role_arn(service_name)
+    return config.service_role_arn(service_name)
 
-def update_lambda_config_only(service_name, bucket_patterns, role_arn, restricted_users, force=False):
+def update_lambda_config_only(service_name, bucket_patterns, role_arn, restricted_users, force=False, assume_yes=False):
     """Update Lambda environment variables instead of code"""
     
-    lambda_client = boto3.client('lambda')
+    lambda_client = get_client('lambda')
     
     try:
         # Get current environment variables
-        response = lambda_client.get_function_configuration(FunctionName='s3bridge-mw-credential-service')
+        response = get_function_configuration('s3bridge-mw-credential-service')
         env_vars = response.get('Environment', {}).get('Variables', {})
         
-        # Check if service already exists
-        service_env_key = f'SERVICE_{service_name.upper()}'
-        if service_env_key in env_vars and not force:
-            print(f"\\nService '{service_name}' already exists")
-            overwrite = input("Overwrite existing service? (y/N): ").lower().strip()
-            if overwrite != 'y':
-                print("Service addition cancelled")
-                return False
+        services = load_services(env_vars)
+        service_key = service_name.lower()
         
-        # Add service as environment variable
+        # Add service to the service index
         service_config = {
             'role': role_arn,
             'buckets': bucket_patterns
@@ -165,13 +140,29 @@ def update_lambda_config_only(service_name, bucket_patterns, role_arn, restricte
         if restricted_users:
             service_config['restricted_users'] = restricted_users
         
-        env_vars[service_env_key] = json.dumps(service_config)
+        new_env_vars = dict(env_vars)
+        # Keep the legacy layout until the deployed code is known to read SERVICE_INDEX
+        store_services(new_env_vars, {**services, service_key: service_config},
+                       legacy=not credential_service_current(response))
+        
+        # Skip the update (and the resulting in-progress state) when nothing changed
+        if new_env_vars == env_vars:
+            print(f"Lambda environment already up to date for service: {service_name}")
+            return True
+        
+        # Check if service already exists
+        if service_key in services and not force:
+            print(f"\\nService '{service_name}' already exists")
+            if not confirm("Overwrite existing service?", assume_yes):
+                print("Service addition cancelled")
+                return False
         
         # Update Lambda environment
         lambda_client.update_function_configuration(
             FunctionName='s3bridge-mw-credential-service',
-            Environment={'Variables': env_vars}
+            Environment={'Variables': new_env_vars}
         )
+        invalidate_function_configuration('s3bridge-mw-credential-service')
         
         print(f"Updated Lambda environment for service: {service_name}")
         return True
@@ -180,9 +171,31 @@ def update_lambda_config_only(service_name, bucket_patterns, role_arn, restricte
         print(f"Failed to update Lambda environment: {e}")
         return False
 
-def check_and_create_buckets(bucket_patterns):
+def bucket_exists(s3, bucket):
+    """Check whether a bucket exists (access denied and other errors count as existing)"""
+    from botocore.exceptions import ClientError
+    
+    try:
+        s3.head_bucket(Bucket=bucket)
+    except ClientError as e:
+        # head_bucket has no body, so a missing bucket surfaces as a bare 404
+        if e.response['Error']['Code'] in ('404', 'NoSuchBucket'):
+            return False
+    except Exception:
+        pass  # Other error, assume exists
+    return True
+
+def create_bucket(s3, bucket):
+    """Create a bucket, reporting the outcome"""
+    try:
+        s3.create_bucket(Bucket=bucket)
+        print(f"Created bucket: {bucket}")
+    except Exception as e:
+        print(f"Failed to create {bucket}: {e}")
+
+def check_and_create_buckets(bucket_patterns, assume_yes=False):
     """Check if buckets exist and offer to create them"""
-    s3 = boto3.client('s3')
+    s3 = get_client('s3')
     
     # Extract actual bucket names from patterns (remove wildcards)
     bucket_names = []
@@ -193,35 +206,26 @@ def check_and_create_buckets(bucket_patterns):
     if not bucket_names:
         return  # Only wildcard patterns, can't pre-create
     
-    missing_buckets = []
-    for bucket in bucket_names:
-        try:
-            s3.head_bucket(Bucket=bucket)
-        except s3.exceptions.NoSuchBucket:
-            missing_buckets.append(bucket)
-        except Exception:
-            pass  # Access denied or other error, assume exists
+    # head_bucket is idempotent and the client is thread-safe, so check all buckets at once
+    with ThreadPoolExecutor(max_workers=min(16, len(bucket_names))) as executor:
+        exists = list(executor.map(lambda bucket: bucket_exists(s3, bucket), bucket_names))
+    missing_buckets = [bucket for bucket, found in zip(bucket_names, exists) if not found]
     
     if missing_buckets:
         print(f"\\nMissing buckets: {', '.join(missing_buckets)}")
-        create = input("Create missing buckets? (y/N): ").lower().strip()
-        
-        if create == 'y':
-            for bucket in missing_buckets:
-                try:
-                    s3.create_bucket(Bucket=bucket)
-                    print(f"Created bucket: {bucket}")
-                except Exception as e:
-                    print(f"Failed to create {bucket}: {e}")
+        if confirm("Create missing buckets?", assume_yes):
+            with ThreadPoolExecutor(max_workers=min(16, len(missing_buckets))) as executor:
+                list(executor.map(lambda bucket: create_bucket(s3, bucket), missing_buckets))
 
-def add_service(service_name, bucket_patterns, permissions='read-write', restricted_users=None, force=False):
+def add_service(service_name, bucket_patterns, permissions='read-write', restricted_users=None, force=False,
+                assume_yes=False):
     """Add new service to Universal S3 Library"""
     
     config = AWSConfig()
     
     # Check if infrastructure is deployed (either CloudFormation or existing API Gateway)
-    existing_api = find_existing_api_gateway()
-    if not config.is_deployed() and not existing_api:
+    existing_api = config.cached_api_gateway_id(find_existing_api_gateway)
+    if not existing_api and not config.is_deployed():
         print("Universal S3 Library not deployed. Run setup first:")
         print("   python scripts/setup.py")
         return False
@@ -234,36 +238,35 @@ def add_service(service_name, bucket_patterns, permissions='read-write', restric
         print(f"Restricted to users: {restricted_users}")
     
     # Check and optionally create buckets
-    check_and_create_buckets(bucket_patterns)
+    check_and_create_buckets(bucket_patterns, assume_yes)
     
     try:
         # Create IAM role
         role_arn = create_service_role(service_name, bucket_patterns, permissions, config)
         
         # Check for existing API Gateway
-        existing_api = find_existing_api_gateway()
         if existing_api:
             print(f"Found existing API Gateway: {existing_api}")
             print(f"Will update existing endpoint instead of creating new one")
             # Update Lambda environment variables
-            success = update_lambda_config_only(service_name, bucket_patterns, role_arn, restricted_users, force)
+            success = update_lambda_config_only(service_name, bucket_patterns, role_arn, restricted_users, force, assume_yes)
             if not success:
                 return False
             
             # Deploy Lambda changes only
             print(f"Deploying Lambda changes only...")
-            import subprocess
-            result = subprocess.run([sys.executable, str(Path(__file__).parent / 'deploy_lambda_only.py')], 
-                                  capture_output=True, text=True)
-            if result.returncode == 0:
+            # Run in-process so the cached boto3 session and clients are reused
+            from scripts.deploy_lambda_only import main as deploy_lambda_main
+            if deploy_lambda_main([]) == 0:
                 print(f"Lambda deployment successful")
             else:
-                print(f"Lambda deployment failed: {result.stderr}")
+                print(f"Lambda deployment failed")
                 return False
         else:
+            deployment = config.load_deployment_config() or {}
             print(f"No existing API Gateway found")
             print(f"Run setup script to deploy infrastructure first:")
-            print(f"   python scripts/setup.py --admin-user {config.load_deployment_config().get('admin_username', 'admin') if config.load_deployment_config() else 'admin'}")
+            print(f"   python scripts/setup.py --admin-user {deployment.get('admin_username', 'admin')}")
             return False
         
         print(f"Service '{service_name}' added successfully!")
@@ -286,6 +289,7 @@ def main():
                        default='read-write', help='Access level')
     parser.add_argument('--restricted-users', help='Comma-separated list of allowed users')
     parser.add_argument('--force', action='store_true', help='Overwrite existing service without confirmation')
+    parser.add_argument('--yes', action='store_true', help='Answer yes to all prompts (e.g. creating missing buckets)')
     
     args = parser.parse_args()
     
@@ -297,7 +301,7 @@ def main():
     if args.restricted_users:
         restricted_users = [u.strip() for u in args.restricted_users.split(',')]
     
-    success = add_service(args.service_name, bucket_patterns, args.permissions, restricted_users, args.force)
+    success = add_service(args.service_name, bucket_patterns, args.permissions, restricted_users, args.force, args.yes)
     return 0 if success else 1
 
 if __name__ == "__main__":
@@ -4,39 +4,110 @@ Deploy only Lambda functions without touching API Gateway
 For S3Bridge Midway
 """
 
-import boto3
+import argparse
+import base64
 import zipfile
+import functools
+import hashlib
 import io
+import os
 from pathlib import Path
 import sys
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
+from config.aws_config import get_client, invalidate_function_configuration
 
-def create_lambda_zip(lambda_dir, function_name):
-    """Create deployment zip for Lambda function"""
-    zip_buffer = io.BytesIO()
+LAMBDA_DIR = Path(__file__).parent.parent / 'lambda_functions'
+
+CREDENTIAL_SERVICE = 's3bridge-mw-credential-service'
+
+# Deployed function name -> source module in lambda_functions/
+LAMBDA_FUNCTIONS = {
+    CREDENTIAL_SERVICE: 's3bridge_mw_credential_service',
+    's3bridge-mw-authorizer': 's3bridge_mw_midway_authorizer'
+}
+
+# Sources up to this size are stored uncompressed; DEFLATE gains little on them
+DEFLATE_MIN_SIZE = 64 * 1024
+
+@functools.lru_cache(maxsize=8)
+def build_lambda_zip(lambda_path, mtime_ns):
+    """Zip a single Lambda source file; cached per file path and modification time"""
+    with open(lambda_path, 'rb') as f:
+        source = f.read()
     
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        lambda_file = lambda_dir / "universal_credential_service.py"
-        if lambda_file.exists():
-            zip_file.write(lambda_file, "lambda_function.py")
-        else:
-            print(f"Lambda file not found: {lambda_file}")
+    # Fixed timestamp and permissions so the package (and its CodeSha256) depends only on content
+    entry = zipfile.ZipInfo("lambda_function.py", date_time=(1980, 1, 1, 0, 0, 0))
+    entry.external_attr = 0o100644 << 16  # regular file, rw-r--r--
+    entry.compress_type = zipfile.ZIP_DEFLATED if len(source) > DEFLATE_MIN_SIZE else zipfile.ZIP_STORED
+    
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
+        zip_file.writestr(entry, source)
     
     return zip_buffer.getvalue()
 
+def create_lambda_zip(lambda_dir, file_name):
+    """Create deployment zip for Lambda function"""
+    lambda_file = lambda_dir / f"{file_name}.py"
+    if not lambda_file.exists():
+        print(f"Lambda file not found: {lambda_file}")
+        return None
+    
+    return build_lambda_zip(str(lambda_file), lambda_file.stat().st_mtime_ns)
+
+# Packages at least this large are staged in S3 (when a deploy bucket is set)
+S3_UPLOAD_THRESHOLD = 1024 * 1024
+
+def lambda_code_location(function_name, zip_content):
+    """Get update_function_code arguments, staging large packages in S3"""
+    deploy_bucket = os.environ.get('S3BRIDGE_DEPLOY_BUCKET')
+    if not deploy_bucket or len(zip_content) < S3_UPLOAD_THRESHOLD:
+        return {'ZipFile': zip_content}
+    
+    # Content-addressed key so re-deploying the same package reuses the object
+    key = f"lambda/{function_name}-{hashlib.sha256(zip_content).hexdigest()[:16]}.zip"
+    get_client('s3').upload_fileobj(io.BytesIO(zip_content), deploy_bucket, key)
+    print(f"Staged deployment package at s3://{deploy_bucket}/{key}")
+    return {'S3Bucket': deploy_bucket, 'S3Key': key}
+
+def package_sha256(zip_content):
+    """Hash a deployment package the way Lambda reports CodeSha256 (base64 SHA-256)"""
+    return base64.b64encode(hashlib.sha256(zip_content).digest()).decode()
+
+def code_unchanged(lambda_client, function_name, zip_content):
+    """Check whether the deployed code already matches this package"""
+    try:
+        response = lambda_client.get_function_configuration(FunctionName=function_name)
+    except Exception:
+        return False
+    return response.get('CodeSha256') == package_sha256(zip_content)
+
+def credential_service_current(function_config):
+    """Check whether a credential service configuration is running this checkout's code"""
+    zip_content = create_lambda_zip(LAMBDA_DIR, LAMBDA_FUNCTIONS[CREDENTIAL_SERVICE])
+    return bool(zip_content) and function_config.get('CodeSha256') == package_sha256(zip_content)
+
 def deploy_lambda(lambda_client, function_name, zip_content):
     """Deploy or update Lambda function"""
     import time
     
+    if code_unchanged(lambda_client, function_name, zip_content):
+        print(f"Function {function_name} already up to date")
+        return "unchanged"
+    
+    code_location = lambda_code_location(function_name, zip_content)
+    
     for attempt in range(3):
         try:
             # Try to update existing function
             response = lambda_client.update_function_code(
                 FunctionName=function_name,
-                ZipFile=zip_content
+                Publish=False,
+                **code_location
             )
+            invalidate_function_configuration(function_name)
             print(f"Updated existing function: {function_name}")
             return response['FunctionArn']
             
@@ -49,20 +120,26 @@ def deploy_lambda(lambda_client, function_name, zip_content):
                 print(f"Function update in progress, waiting 10 seconds...")
                 time.sleep(10)
             else:
-                print(f"Function still updating after retries - service role created successfully")
-                return "skipped"
+                print(f"Function {function_name} still updating after retries - code not deployed")
+                return None
     
     return None
 
-def main():
+def main(argv=None):
     """Deploy Lambda functions only"""
+    parser = argparse.ArgumentParser(description='Deploy S3Bridge Midway Lambda functions without touching API Gateway')
+    parser.add_argument('--functions', default='s3bridge-mw-credential-service',
+                       help=f"Comma-separated functions to deploy (choices: {', '.join(LAMBDA_FUNCTIONS)})")
     
-    lambda_client = boto3.client('lambda')
-    lambda_dir = Path(__file__).parent.parent / 'lambda_functions'
+    args = parser.parse_args(argv)
     
-    functions = [
-        's3bridge-mw-credential-service'
-    ]
+    functions = [f.strip() for f in args.functions.split(',')]
+    unknown = [f for f in functions if f not in LAMBDA_FUNCTIONS]
+    if unknown:
+        print(f"Unknown Lambda functions: {', '.join(unknown)}")
+        return 1
+    
+    lambda_client = get_client('lambda')
     
     print("Deploying Lambda functions only (preserving API Gateway)...")
     
@@ -70,7 +147,9 @@ def main():
         print(f"Deploying {function_name}...")
         
         # Create deployment package
-        zip_content = create_lambda_zip(lambda_dir, function_name)
+        zip_content = create_lambda_zip(LAMBDA_DIR, LAMBDA_FUNCTIONS[function_name])
+        if not zip_content:
+            return 1
         
         # Deploy function
         arn = deploy_lambda(lambda_client, function_name, zip_content)
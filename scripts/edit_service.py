@@ -4,15 +4,18 @@ Edit Service Script
 Modifies existing service configuration
 """
 
-import boto3
-import json
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config.aws_config import AWSConfig
+from config.aws_config import (
+    AWSConfig, get_client, get_function_configuration, invalidate_function_configuration,
+    load_services, store_services, s3_policy_document
+)
+from scripts.deploy_lambda_only import credential_service_current
 
 def edit_service(service_name, bucket_patterns=None, permissions=None, restricted_users=None):
     """Edit existing service configuration"""
@@ -24,21 +27,22 @@ def edit_service(service_name, bucket_patterns=None, permissions=None, restricte
         return False
     
     try:
-        lambda_client = boto3.client('lambda')
-        iam = boto3.client('iam')
+        lambda_client = get_client('lambda')
+        iam = get_client('iam')
         
         # Get current environment variables
-        response = lambda_client.get_function_configuration(FunctionName='s3bridge-mw-credential-service')
+        response = get_function_configuration('s3bridge-mw-credential-service')
         env_vars = response.get('Environment', {}).get('Variables', {})
         
-        service_env_key = f'SERVICE_{service_name.upper()}'
+        services = load_services(env_vars)
+        service_key = service_name.lower()
         
-        if service_env_key not in env_vars:
+        if service_key not in services:
             print(f"Service '{service_name}' not found")
             return False
         
         # Get current configuration
-        current_config = json.loads(env_vars[service_env_key])
+        current_config = services[service_key]
         print(f"Current configuration for '{service_name}':")
         print(f"  Buckets: {', '.join(current_config['buckets'])}")
         print(f"  Role: {current_config['role']}")
@@ -60,46 +64,42 @@ def edit_service(service_name, bucket_patterns=None, permissions=None, restricte
                 current_config.pop('restricted_users', None)
                 print("Removed user restrictions")
         
-        # Update IAM policy if permissions changed
-        if permissions:
-            s3_actions = {
-                'read-only': ['s3:GetObject', 's3:ListBucket'],
-                'read-write': ['s3:GetObject', 's3:PutObject', 's3:DeleteObject', 's3:ListBucket'],
-                'admin': ['s3:*']
-            }
-            
-            # Create S3 resources from bucket patterns
-            s3_resources = []
-            for pattern in current_config['buckets']:
-                s3_resources.extend([
-                    f"arn:aws:s3:::{pattern}",
-                    f"arn:aws:s3:::{pattern}/*"
-                ])
+        # IAM and Lambda are independent services, so issue their updates concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            pending = []
             
-            # Update IAM policy
-            policy_doc = {
-                "Version": "2012-10-17",
-                "Statement": [{
-                    "Effect": "Allow",
-                    "Action": s3_actions[permissions],
-                    "Resource": s3_resources
-                }]
-            }
+            # Update IAM policy if permissions changed
+            if permissions:
+                role_name = f"{service_name}-s3-access-role"
+                pending.append(executor.submit(
+                    iam.put_role_policy,
+                    RoleName=role_name,
+                    PolicyName=f"{service_name}S3AccessPolicy",
+                    PolicyDocument=s3_policy_document(permissions, current_config['buckets'])
+                ))
             
-            role_name = f"{service_name}-s3-access-role"
-            iam.put_role_policy(
-                RoleName=role_name,
-                PolicyName=f"{service_name}S3AccessPolicy",
-                PolicyDocument=json.dumps(policy_doc)
-            )
-            print(f"Updated IAM policy with {permissions} permissions")
+            # Update Lambda environment, skipping the call when nothing changed
+            new_env_vars = dict(env_vars)
+            # Keep the legacy layout until the deployed code is known to read SERVICE_INDEX
+            store_services(new_env_vars, services, legacy=not credential_service_current(response))
+            env_changed = new_env_vars != env_vars
+            if env_changed:
+                pending.append(executor.submit(
+                    lambda_client.update_function_configuration,
+                    FunctionName='s3bridge-mw-credential-service',
+                    Environment={'Variables': new_env_vars}
+                ))
+        
+        # Drop the cached configuration even if the IAM update failed
+        if env_changed:
+            invalidate_function_configuration('s3bridge-mw-credential-service')
         
-        # Update Lambda environment
-        env_vars[service_env_key] = json.dumps(current_config)
-        lambda_client.update_function_configuration(
-            FunctionName='s3bridge-mw-credential-service',
-            Environment={'Variables': env_vars}
-        )
+        # Surface the first failure, as the sequential calls did
+        for future in pending:
+            future.result()
+        
+        if permissions:
+            print(f"Updated IAM policy with {permissions} permissions")
         
         print(f"Service '{service_name}' updated successfully")
         return True
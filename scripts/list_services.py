@@ -4,14 +4,12 @@ List Services Script
 Shows all registered services in Universal S3 Library
 """
 
-import boto3
-import json
 import sys
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config.aws_config import AWSConfig
+from config.aws_config import AWSConfig, get_function_configuration, load_services
 
 def list_services():
     """List all registered services"""
@@ -23,24 +21,18 @@ def list_services():
         return False
     
     try:
-        lambda_client = boto3.client('lambda')
-        response = lambda_client.get_function_configuration(FunctionName='s3bridge-mw-credential-service')
+        response = get_function_configuration('s3bridge-mw-credential-service')
         env_vars = response.get('Environment', {}).get('Variables', {})
         
-        services = {}
-        for key, value in env_vars.items():
-            if key.startswith('SERVICE_'):
-                service_name = key[8:].lower()
-                try:
-                    services[service_name] = json.loads(value)
-                except json.JSONDecodeError:
-                    continue
+        services = load_services(env_vars)
         
         # Add universal service if admin username is set
         admin_username = env_vars.get('ADMIN_USERNAME')
         if admin_username:
+            # Fall back to the (cached) caller account rather than building an invalid ARN
+            account_id = env_vars.get('AWS_ACCOUNT_ID') or config.account_id
             services['universal'] = {
-                'role': f"arn:aws:iam::{env_vars.get('AWS_ACCOUNT_ID', 'unknown')}:role/service-role/universal-s3-access-role",
+                'role': f"arn:aws:iam::{account_id}:role/service-role/universal-s3-access-role",
                 'buckets': ['*'],
                 'restricted_users': [admin_username]
             }
@@ -4,15 +4,51 @@ Remove Service Script
 Removes service from Universal S3 Library
 """
 
-import boto3
-import json
 import argparse
 import sys
+import time
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config.aws_config import AWSConfig
+from config.aws_config import (
+    AWSConfig, get_client, get_function_configuration, invalidate_function_configuration,
+    load_services, store_services
+)
+from scripts.deploy_lambda_only import credential_service_current
+
+def delete_service_role(iam, service_name):
+    """Delete a service's IAM role (its inline policy must go first)"""
+    role_name = f"{service_name}-s3-access-role"
+    try:
+        # Delete role policy first
+        iam.delete_role_policy(
+            RoleName=role_name,
+            PolicyName=f"{service_name}S3AccessPolicy"
+        )
+        # Delete role
+        iam.delete_role(RoleName=role_name)
+        print(f"Removed IAM role: {role_name}")
+    except iam.exceptions.NoSuchEntityException:
+        print(f"IAM role {role_name} not found (already deleted)")
+
+def update_service_index(lambda_client, env_vars):
+    """Write the credential service environment, retrying while another update is in progress"""
+    for attempt in range(3):
+        try:
+            lambda_client.update_function_configuration(
+                FunctionName='s3bridge-mw-credential-service',
+                Environment={'Variables': env_vars}
+            )
+            invalidate_function_configuration('s3bridge-mw-credential-service')
+            return True
+        except lambda_client.exceptions.ResourceConflictException:
+            if attempt < 2:
+                print(f"Function update in progress, waiting 10 seconds...")
+                time.sleep(10)
+    
+    print("Function still updating after retries")
+    return False
 
 def remove_service(service_name, force=False):
     """Remove service from Universal S3 Library"""
@@ -24,16 +60,17 @@ def remove_service(service_name, force=False):
         return False
     
     try:
-        lambda_client = boto3.client('lambda')
-        iam = boto3.client('iam')
+        lambda_client = get_client('lambda')
+        iam = get_client('iam')
         
         # Get current environment variables
-        response = lambda_client.get_function_configuration(FunctionName='s3bridge-mw-credential-service')
+        response = get_function_configuration('s3bridge-mw-credential-service')
         env_vars = response.get('Environment', {}).get('Variables', {})
         
-        service_env_key = f'SERVICE_{service_name.upper()}'
+        services = load_services(env_vars)
+        service_key = service_name.lower()
         
-        if service_env_key not in env_vars:
+        if service_key not in services:
             print(f"Service '{service_name}' not found")
             return False
         
@@ -45,26 +82,16 @@ def remove_service(service_name, force=False):
                 return False
         
         # Remove from Lambda environment
-        del env_vars[service_env_key]
-        lambda_client.update_function_configuration(
-            FunctionName='s3bridge-mw-credential-service',
-            Environment={'Variables': env_vars}
-        )
-        print(f"Removed Lambda configuration for service: {service_name}")
+        del services[service_key]
+        # Keep the legacy layout until the deployed code is known to read SERVICE_INDEX
+        store_services(env_vars, services, legacy=not credential_service_current(response))
         
-        # Remove IAM role
-        role_name = f"{service_name}-s3-access-role"
-        try:
-            # Delete role policy first
-            iam.delete_role_policy(
-                RoleName=role_name,
-                PolicyName=f"{service_name}S3AccessPolicy"
-            )
-            # Delete role
-            iam.delete_role(RoleName=role_name)
-            print(f"Removed IAM role: {role_name}")
-        except iam.exceptions.NoSuchEntityException:
-            print(f"IAM role {role_name} not found (already deleted)")
+        # The role must outlive the registration, so tear it down only once the Lambda update went through
+        if not update_service_index(lambda_client, env_vars):
+            print(f"Service '{service_name}' is still registered; IAM role left in place")
+            return False
+        print(f"Removed Lambda configuration for service: {service_name}")
+        delete_service_role(iam, service_name)
         
         print(f"Service '{service_name}' removed successfully")
         return True
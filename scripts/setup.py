@@ -4,80 +4,19 @@ S3Bridge Midway Setup Script
 Deploys infrastructure to any AWS account
 """
 
-import boto3
 import json
 import time
-import zipfile
-import io
 from pathlib import Path
 import argparse
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from config.aws_config import AWSConfig
-
-def find_existing_api_gateway():
-    """Find existing API Gateway that uses s3bridge-mw-credential-service"""
-    try:
-        api_client = boto3.client('apigateway')
-        lambda_client = boto3.client('lambda')
-        
-        # Get s3bridge-mw-credential-service function ARN
-        try:
-            func_response = lambda_client.get_function(FunctionName='s3bridge-mw-credential-service')
-            target_function_arn = func_response['Configuration']['FunctionArn']
-        except lambda_client.exceptions.ResourceNotFoundException:
-            return None
-        
-        # List all APIs
-        apis = api_client.get_rest_apis()
-        
-        for api in apis['items']:
-            api_id = api['id']
-            try:
-                # Get resources for this API
-                resources = api_client.get_resources(restApiId=api_id)
-                
-                for resource in resources['items']:
-                    # Check if this resource has GET method
-                    if 'GET' in resource.get('resourceMethods', {}):
-                        try:
-                            # Get integration for GET method
-                            integration = api_client.get_integration(
-                                restApiId=api_id,
-                                resourceId=resource['id'],
-                                httpMethod='GET'
-                            )
-                            
-                            # Check if integration points to our Lambda function
-                            integration_uri = integration.get('uri', '')
-                            if 's3bridge-mw-credential-service' in integration_uri:
-                                return api_id
-                                
-                        except Exception:
-                            continue
-                            
-            except Exception:
-                continue
-                
-        return None
-        
-    except Exception as e:
-        print(f"⚠️  Could not search for existing API Gateway: {e}")
-        return None
-
-def create_lambda_zip(lambda_dir, function_name):
-    """Create deployment zip for Lambda function"""
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        lambda_file = lambda_dir / f"{function_name}.py"
-        if lambda_file.exists():
-            zip_file.write(lambda_file, "lambda_function.py")
-    
-    return zip_buffer.getvalue()
+from config.aws_config import AWSConfig, get_client
+from scripts.add_service import find_existing_api_gateway
+from scripts.deploy_lambda_only import LAMBDA_DIR, LAMBDA_FUNCTIONS, create_lambda_zip, deploy_lambda
 
 def deploy_infrastructure(admin_username='admin', force=False):
     """Deploy S3Bridge Midway infrastructure"""
@@ -88,8 +27,11 @@ def deploy_infrastructure(admin_username='admin', force=False):
     print(f"📍 Region: {config.region}")
     print(f"👤 Admin user: {admin_username}")
     
-    # Check for existing API Gateway first
-    existing_api = find_existing_api_gateway()
+    # Check for existing API Gateway first (--force always rescans instead of trusting the saved ID)
+    if force:
+        existing_api = find_existing_api_gateway()
+    else:
+        existing_api = config.cached_api_gateway_id(find_existing_api_gateway)
     if existing_api:
         print(f"🔍 Found existing API Gateway: {existing_api}")
         if not force:
@@ -112,7 +54,7 @@ def deploy_infrastructure(admin_username='admin', force=False):
         template = f.read()
     
     # Deploy CloudFormation stack
-    cf = boto3.client('cloudformation')
+    cf = config.cloudformation
     
     try:
         print("📦 Creating CloudFormation stack...")
@@ -127,7 +69,7 @@ def deploy_infrastructure(admin_username='admin', force=False):
         
         print("⏳ Waiting for stack creation...")
         waiter = cf.get_waiter('stack_create_complete')
-        waiter.wait(StackName=config.stack_name, WaiterConfig={'Delay': 10, 'MaxAttempts': 60})
+        waiter.wait(StackName=config.stack_name, WaiterConfig={'Delay': 3, 'MaxAttempts': 200})
         
         print("✅ CloudFormation stack created successfully")
         
@@ -154,30 +96,34 @@ def deploy_infrastructure(admin_username='admin', force=False):
 
 def deploy_lambda_functions(config):
     """Deploy Lambda function code"""
+    lambda_client = get_client('lambda')
     
-    lambda_client = boto3.client('lambda')
-    lambda_dir = Path(__file__).parent.parent / "lambda_functions"
-    
-    functions = [
-        ('s3bridge_mw_credential_service', 's3bridge-mw-credential-service'),
-        ('s3bridge_mw_midway_authorizer', 's3bridge-mw-authorizer')
-    ]
-    
-    for file_name, function_name in functions:
+    # Build every package up front, then upload them concurrently on the shared client
+    packages = {}
+    for function_name, file_name in LAMBDA_FUNCTIONS.items():
         print(f"📤 Deploying {function_name}...")
-        
-        # Create deployment package
-        zip_content = create_lambda_zip(lambda_dir, file_name)
-        
-        # Update function code
-        try:
-            lambda_client.update_function_code(
-                FunctionName=function_name,
-                ZipFile=zip_content
-            )
-            print(f"✅ {function_name} deployed")
-        except Exception as e:
-            print(f"⚠️  Failed to deploy {function_name}: {e}")
+        zip_content = create_lambda_zip(LAMBDA_DIR, file_name)
+        if zip_content:
+            packages[function_name] = zip_content
+    
+    if not packages:
+        return
+    
+    # deploy_lambda brings the CodeSha256 check, conflict retries and S3 staging of large packages
+    with ThreadPoolExecutor(max_workers=min(8, len(packages))) as executor:
+        futures = {
+            executor.submit(deploy_lambda, lambda_client, function_name, zip_content): function_name
+            for function_name, zip_content in packages.items()
+        }
+        for future in as_completed(futures):
+            function_name = futures[future]
+            try:
+                if future.result():
+                    print(f"✅ {function_name} deployed")
+                else:
+                    print(f"⚠️  Failed to deploy {function_name}")
+            except Exception as e:
+                print(f"⚠️  Failed to deploy {function_name}: {e}")
 
 def main():
     parser = argparse.ArgumentParser(description='Deploy S3Bridge Midway')
@@ -192,7 +138,7 @@ def main():
     
     # Check AWS credentials
     try:
-        boto3.client('sts').get_caller_identity()
+        get_client('sts').get_caller_identity()
     except Exception as e:
         print(f"❌ AWS credentials not configured: {e}")
         print("💡 Run 'aws configure' to set up credentials")
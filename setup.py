@@ -25,6 +25,7 @@ setup(
     install_requires=[
         "boto3>=1.26.0",
         "requests>=2.28.0",
+        "orjson>=3.9.0",
     ],
     entry_points={
         "console_scripts": [